@@ -8,21 +8,63 @@ Features automatic cookie refresh to maintain persistent login.
 import sys
 import json
 import os
+import base64
 import requests
+from http.cookiejar import DefaultCookiePolicy
 from pathlib import Path
+from urllib.parse import unquote
 from datetime import datetime, timedelta
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
     QLabel, QProgressBar
 )
 from PySide6.QtCore import QTimer, Qt, QUrl, Slot
+from PySide6.QtNetwork import QNetworkCookie
 from PySide6.QtWebEngineWidgets import QWebEngineView
-from PySide6.QtWebEngineCore import QWebEnginePage, QWebEngineProfile
+from PySide6.QtWebEngineCore import QWebEnginePage, QWebEngineProfile, QWebEngineSettings
+
+try:
+    import orjson
+except ImportError:  # Optional speedup, fall back to stdlib json
+    orjson = None
+
+# Saved cookies younger than this are reused without a fresh login
+_COOKIE_MAX_AGE = timedelta(minutes=55)
+# Assumed lifetime of a session cookie
+_COOKIE_LIFETIME = timedelta(hours=1)
+
+
+def _dump_json(data):
+    """Serialize data to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def _load_json(raw):
+    """Parse JSON from bytes."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
 
 
 class CreditsMonitor(QMainWindow):
     """Main application window with automatic cookie management."""
 
+    # Fixed headers sent with every credits API request
+    _API_HEADERS = {
+        'Accept': 'application/json',
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+    }
+
+    # Stylesheets for the normal and error states (applied only on transitions)
+    _STYLE_PCT_OK = "font-size: 20px; font-weight: bold;"
+    _STYLE_PCT_ERR = "font-size: 20px; font-weight: bold; color: #f44336;"
+    _STYLE_CREDITS_OK = "font-size: 12px;"
+    _STYLE_CREDITS_ERR = "font-size: 12px; color: #f44336;"
+    _STYLE_BAR_OK = "QProgressBar { height: 14px; }"
+    _STYLE_BAR_ERR = "QProgressBar { height: 14px; } QProgressBar::chunk { background-color: #f44336; }"
+
     def __init__(self):
         super().__init__()
         self.api_url = "https://app.augmentcode.com/api/credits"
@@ -37,12 +79,38 @@ class CreditsMonitor(QMainWindow):
         self.cookies = {}
         self.cookie_expiry = None
 
-        # Browser (background only)
+        # Last rendered (remaining, total), used to skip redundant redraws
+        self._last_values = None
+        self._state = "init"  # "init", "ok" or "err"
+
+        # Coalesces bursts of cookieAdded signals into a single save
+        self._save_pending = False
+        # A cookie refresh ran; bump saved_at once the API accepts the cookies
+        self._refreshed_since_save = False
+
+        # (raw _session value, whether its payload carries a userId)
+        self._session_has_user = (None, False)
+
+        # Browser (background only, created on first use)
         self.web_view = None
         self.web_page = None
+        self._browser_ready = False
+        # Set once a failed poll has triggered a refresh; cleared on success
+        self._failure_refresh_done = False
+
+        # Persistent HTTP session (keep-alive + connection pooling).
+        # Fetches run on the GUI thread, so a connection failure is retried
+        # once and a read timeout fails the poll right away.
+        self.http = requests.Session()
+        retries = requests.adapters.Retry(total=1, connect=1, read=0)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retries)
+        self.http.mount("https://", adapter)
+        self.http.headers.update(self._API_HEADERS)
+        # self.cookies is the only cookie source; never keep Set-Cookie
+        # values from API responses in the session
+        self.http.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
 
         self.init_ui()
-        self.setup_browser()
         self.load_cookies_from_file()
         self.setup_timers()
 
@@ -60,7 +128,7 @@ class CreditsMonitor(QMainWindow):
 
         # Percentage (large and prominent)
         self.percentage_label = QLabel("--.-%")
-        self.percentage_label.setStyleSheet("font-size: 20px; font-weight: bold;")
+        self.percentage_label.setStyleSheet(self._STYLE_PCT_OK)
         self.percentage_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(self.percentage_label)
 
@@ -70,12 +138,12 @@ class CreditsMonitor(QMainWindow):
         self.progress_bar.setMaximum(1000)  # Use 1000 for decimal precision
         self.progress_bar.setValue(0)
         self.progress_bar.setTextVisible(False)
-        self.progress_bar.setStyleSheet("QProgressBar { height: 14px; }")
+        self.progress_bar.setStyleSheet(self._STYLE_BAR_OK)
         main_layout.addWidget(self.progress_bar)
 
         # Credits numbers (remaining / total)
         self.credits_label = QLabel("--- / ---")
-        self.credits_label.setStyleSheet("font-size: 12px;")
+        self.credits_label.setStyleSheet(self._STYLE_CREDITS_OK)
         self.credits_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(self.credits_label)
 
@@ -86,48 +154,64 @@ class CreditsMonitor(QMainWindow):
         self.web_page = QWebEnginePage(QWebEngineProfile.defaultProfile(), self.web_view)
         self.web_view.setPage(self.web_page)
 
+        # Only the Set-Cookie round trip matters; turn off everything heavy
+        settings = self.web_page.settings()
+        settings.setAttribute(QWebEngineSettings.WebGLEnabled, False)
+        settings.setAttribute(QWebEngineSettings.PluginsEnabled, False)
+        settings.setAttribute(QWebEngineSettings.ScreenCaptureEnabled, False)
+        settings.setAttribute(QWebEngineSettings.Accelerated2dCanvasEnabled, False)
+        settings.setAttribute(QWebEngineSettings.AutoLoadImages, False)
+        settings.setAttribute(QWebEngineSettings.PlaybackRequiresUserGesture, True)
+        settings.setAttribute(QWebEngineSettings.ShowScrollBars, False)
+        self.web_page.profile().setHttpCacheType(QWebEngineProfile.NoCache)
+
         # Connect cookie store
         cookie_store = self.web_page.profile().cookieStore()
         cookie_store.cookieAdded.connect(self.on_cookie_added)
 
-        # Load existing cookies into browser
+    def _ensure_browser(self):
+        """Create the browser and restore saved cookies, if not done yet."""
+        if self._browser_ready:
+            return
+        self.setup_browser()
         self.load_cookies_into_browser()
+        self._browser_ready = True
 
     def load_cookies_into_browser(self):
         """Load saved cookies into the browser."""
         if not self.cookies:
             return
 
-        from PySide6.QtNetwork import QNetworkCookie
         cookie_store = self.web_page.profile().cookieStore()
+        url = QUrl("https://app.augmentcode.com")
+        pairs = [(name.encode(), value.encode()) for name, value in self.cookies.items()]
 
-        for name, value in self.cookies.items():
-            cookie = QNetworkCookie(name.encode(), value.encode())
+        for name, value in pairs:
+            cookie = QNetworkCookie(name, value)
             cookie.setDomain(".augmentcode.com")
             cookie.setPath("/")
-            cookie_store.setCookie(cookie, QUrl("https://app.augmentcode.com"))
+            cookie_store.setCookie(cookie, url)
 
     def load_cookies_from_file(self):
         """Load cookies from file, or use initial cookies if file doesn't exist."""
         try:
             if self.cookie_file.exists():
                 # Load from file
-                with open(self.cookie_file, 'r') as f:
-                    data = json.load(f)
-                    self.cookies = data.get('cookies', {})
-
-                    # Check if cookies are still valid (within 55 minutes)
-                    saved_time = data.get('saved_at')
-                    if saved_time:
-                        saved_datetime = datetime.fromisoformat(saved_time)
-                        age_minutes = (datetime.now() - saved_datetime).total_seconds() / 60
-
-                        if age_minutes < 55:  # Still fresh
-                            self.cookie_expiry = saved_datetime + timedelta(hours=1)
-                            print(f"Loaded cookies from file (age: {age_minutes:.1f} min)")
-                            return
-                        else:
-                            print(f"Cookies too old ({age_minutes:.1f} min), need fresh login")
+                data = _load_json(self.cookie_file.read_bytes())
+                self.cookies = data.get('cookies', {})
+
+                # Check if cookies are still valid (within 55 minutes)
+                saved_time = data.get('saved_at')
+                if saved_time:
+                    saved_datetime = datetime.fromisoformat(saved_time)
+                    age = datetime.now() - saved_datetime
+
+                    if age < _COOKIE_MAX_AGE:  # Still fresh
+                        self.cookie_expiry = saved_datetime + _COOKIE_LIFETIME
+                        print(f"Loaded cookies from file (age: {age / timedelta(minutes=1):.1f} min)")
+                        return
+                    else:
+                        print(f"Cookies too old ({age / timedelta(minutes=1):.1f} min), need fresh login")
 
             # No valid cookies found - need to login
             print("No saved cookies found. Please login via browser.")
@@ -140,26 +224,39 @@ class CreditsMonitor(QMainWindow):
 
     def save_cookies_to_file(self):
         """Save current cookies to file."""
+        tmp = self.cookie_file.with_suffix(".json.tmp")
         try:
             data = {
                 'cookies': self.cookies,
                 'saved_at': datetime.now().isoformat()
             }
-            with open(self.cookie_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Write to a private sibling temp file, sync it and rename, so a
+            # crash mid-write never leaves a truncated cookie file behind
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_dump_json(data))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.cookie_file)
             print(f"Saved cookies to {self.cookie_file}")
         except Exception as e:
             print(f"Error saving cookies: {e}")
+            tmp.unlink(missing_ok=True)
 
     def setup_timers(self):
         """Setup timers for auto-refresh."""
+        # Neither timer needs millisecond precision; coarse timers let the
+        # OS keep its default tick and coalesce wakeups.
+
         # Data refresh timer (every minute)
         self.data_refresh_timer = QTimer()
+        self.data_refresh_timer.setTimerType(Qt.CoarseTimer)
         self.data_refresh_timer.timeout.connect(self.fetch_credits)
         self.data_refresh_timer.start(self.data_refresh_interval)
 
         # Cookie refresh timer (every 50 minutes)
         self.cookie_refresh_timer = QTimer()
+        self.cookie_refresh_timer.setTimerType(Qt.CoarseTimer)
         self.cookie_refresh_timer.timeout.connect(self.refresh_cookies)
         self.cookie_refresh_timer.start(self.cookie_refresh_interval)
 
@@ -174,27 +271,45 @@ class CreditsMonitor(QMainWindow):
 
         # Don't overwrite _session cookie if it already has user info
         if cookie_name == '_session' and '_session' in self.cookies:
-            # Check if existing cookie has user info
-            import base64
-            from urllib.parse import unquote
-            try:
-                existing_decoded = unquote(self.cookies['_session'])
-                if '.' in existing_decoded:
-                    payload = existing_decoded.split('.')[0]
-                    decoded_payload = base64.b64decode(payload + '==').decode('utf-8', errors='ignore')
-                    if 'userId' in decoded_payload:
-                        # Existing cookie has user info, don't overwrite
-                        return
-            except:
-                pass
+            # Check if existing cookie has user info (decoded once per value)
+            existing = self.cookies['_session']
+            cached_value, has_user = self._session_has_user
+            if cached_value != existing:
+                has_user = False
+                try:
+                    existing_decoded = unquote(existing)
+                    payload, sep, _ = existing_decoded.partition('.')
+                    if sep:
+                        decoded_payload = base64.b64decode(payload + '==').decode('utf-8', errors='ignore')
+                        has_user = 'userId' in decoded_payload
+                except:
+                    pass
+                self._session_has_user = (existing, has_user)
+            if has_user:
+                # Existing cookie has user info, don't overwrite
+                return
+
+        # Re-delivery of a value we already hold, nothing to save
+        if self.cookies.get(cookie_name) == cookie_value:
+            return
 
         self.cookies[cookie_name] = cookie_value
 
         # Update cookie status and save
         if '_session' in self.cookies or 'web_rpc_proxy_session' in self.cookies:
-            self.cookie_expiry = datetime.now() + timedelta(hours=1)
-            # Save cookies immediately when updated
-            self.save_cookies_to_file()
+            self.cookie_expiry = datetime.now() + _COOKIE_LIFETIME
+            self._schedule_save()
+
+    def _schedule_save(self):
+        """Schedule a save; further requests within the window share it."""
+        if not self._save_pending:
+            self._save_pending = True
+            QTimer.singleShot(500, self._flush_cookies)
+
+    def _flush_cookies(self):
+        """Write pending cookie changes to file."""
+        self._save_pending = False
+        self.save_cookies_to_file()
 
 
 
@@ -203,35 +318,46 @@ class CreditsMonitor(QMainWindow):
     @Slot()
     def refresh_cookies(self):
         """Automatically refresh cookies by reloading the page in background."""
+        self._ensure_browser()
+        self._refreshed_since_save = True
         if self.web_view:
             self.web_view.setUrl(QUrl(self.login_url))
             print(f"[{datetime.now().strftime('%H:%M:%S')}] Auto-refreshing cookies...")
             # Cookies will be saved automatically via on_cookie_added callback
 
+    def _refresh_after_failure(self):
+        """Refresh cookies once per streak of failed polls."""
+        # The view is hidden, so reloading on every failed tick can't help;
+        # later attempts are left to the regular cookie refresh timer
+        if self._failure_refresh_done:
+            return
+        self._failure_refresh_done = True
+        self.refresh_cookies()
+
     @Slot()
     def fetch_credits(self):
         """Fetch credits data from API using stored cookies."""
         if not self.cookies:
             self.show_error_state()
+            self._refresh_after_failure()
             return
 
         try:
-            response = requests.get(
-                self.api_url,
-                cookies=self.cookies,
-                headers={
-                    'Accept': 'application/json',
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-                },
-                timeout=10
-            )
+            response = self.http.get(self.api_url, cookies=self.cookies, timeout=(3, 10))
 
             if response.status_code == 200:
-                data = response.json()
+                data = _load_json(response.content)
+                self._failure_refresh_done = False
+                # Unchanged cookies are not re-saved via on_cookie_added, so
+                # record the successful refresh here
+                if self._refreshed_since_save:
+                    self._refreshed_since_save = False
+                    self._schedule_save()
                 self.handle_credits_response(data)
             elif response.status_code == 401 or response.status_code == 403:
                 self.show_error_state()
                 print("Cookie expired. Please check saved cookies file.")
+                self._refresh_after_failure()
             else:
                 raise Exception(f"HTTP {response.status_code}")
 
@@ -252,6 +378,12 @@ class CreditsMonitor(QMainWindow):
         remaining = data.get("usageUnitsRemaining", 0)
         total = remaining + data.get("usageUnitsConsumedThisBillingCycle", 0)
 
+        # Nothing changed since the last successful poll
+        key = (remaining, total)
+        if key == self._last_values and self._state == "ok":
+            return
+        self._last_values = key
+
         # Calculate percentage with one decimal place
         if total > 0:
             percentage = (remaining / total) * 100
@@ -261,21 +393,30 @@ class CreditsMonitor(QMainWindow):
             percentage = 0.0
             self.progress_bar.setValue(0)
 
-        # Update labels - reset to normal style
+        # Update labels
         self.percentage_label.setText(f"{percentage:.1f}%")
-        self.percentage_label.setStyleSheet("font-size: 20px; font-weight: bold;")
         self.credits_label.setText(f"{remaining:,} / {total:,}")
-        self.credits_label.setStyleSheet("font-size: 12px;")
-        self.progress_bar.setStyleSheet("QProgressBar { height: 14px; }")
+
+        # Reset to normal style only when entering the normal state
+        if self._state != "ok":
+            self.percentage_label.setStyleSheet(self._STYLE_PCT_OK)
+            self.credits_label.setStyleSheet(self._STYLE_CREDITS_OK)
+            self.progress_bar.setStyleSheet(self._STYLE_BAR_OK)
+            self._state = "ok"
 
     def show_error_state(self):
         """Show error state with red styling."""
+        # Widgets already show the error state
+        if self._state == "err":
+            return
+
         self.percentage_label.setText("ERROR")
-        self.percentage_label.setStyleSheet("font-size: 20px; font-weight: bold; color: #f44336;")
         self.credits_label.setText("--- / ---")
-        self.credits_label.setStyleSheet("font-size: 12px; color: #f44336;")
         self.progress_bar.setValue(0)
-        self.progress_bar.setStyleSheet("QProgressBar { height: 14px; } QProgressBar::chunk { background-color: #f44336; }")
+        self.percentage_label.setStyleSheet(self._STYLE_PCT_ERR)
+        self.credits_label.setStyleSheet(self._STYLE_CREDITS_ERR)
+        self.progress_bar.setStyleSheet(self._STYLE_BAR_ERR)
+        self._state = "err"
 
 
 
@@ -294,6 +435,7 @@ def main():
 
     # Save cookies on exit
     app.aboutToQuit.connect(window.save_cookies_to_file)
+    app.aboutToQuit.connect(window.http.close)
 
     sys.exit(app.exec())
 